@@ -1,10 +1,11 @@
 """API key authentication dependency for FastAPI."""
 
+import hmac
 import logging
-from fastapi import Depends, HTTPException, Security, status
+from fastapi import HTTPException, Security, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from app.config import AppConfig, get_config
+from app.config import get_config
 
 logger = logging.getLogger(__name__)
 
@@ -13,10 +14,10 @@ security_scheme = HTTPBearer()
 
 async def verify_api_key(
     credentials: HTTPAuthorizationCredentials = Security(security_scheme),
-    config: AppConfig = Depends(get_config),
 ) -> str:
     """Validate Bearer token against the configured API key."""
-    if credentials.credentials != config.api_key:
+    config = get_config()
+    if not hmac.compare_digest(credentials.credentials.encode("utf-8"), config.api_key_bytes):
         logger.warning("Authentication failed: invalid API key")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,12 +1,11 @@
 """Application configuration reader.
 
-Reads settings from config.ini using configparser.
+Reads settings from config.ini with a minimal flat INI parser.
 All settings have sensible defaults if keys are missing.
 """
 
-import configparser
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from functools import lru_cache
 
@@ -33,44 +32,101 @@ class AppConfig:
     ollama_num_predict: int = 4096
     ollama_repeat_penalty: float = 1.3
     ollama_repeat_last_n: int = 256
+    ollama_keep_alive: str = "30m"
+    ollama_extraction_think: bool = False
 
     # [ocr]
-    ocr_languages: list[str] = ("uk", "en")
+    ocr_languages: tuple[str, ...] = ("uk", "en")
     ocr_use_gpu: bool = False
 
     # [processing]
     max_upload_size_mb: int = 50
+    upload_chunk_size_kb: int = 1024
     max_total_tokens_estimate: int = 60000
     prompt_file: str = "prompts/analysis_prompt.txt"
     extraction_prompt_file: str = "prompts/extraction_prompt.txt"
     report_prompt_file: str = "prompts/report_prompt.txt"
+    tokenizer_file: str = "models/o200k_base.tiktoken"
+
+    # [cache]
+    llm_cache_enabled: bool = True
+    llm_cache_dir: str = "cache/llm"
+    llm_cache_ttl_seconds: int = 86400
+
+    # Pre-encoded api_key for constant-time comparison in auth
+    api_key_bytes: bytes = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "api_key_bytes", self.api_key.encode("utf-8"))
+
+
+_TRUE_VALUES = {"1", "yes", "true", "on"}
+_FALSE_VALUES = {"0", "no", "false", "off"}
+
+
+def _parse_ini(path: Path) -> dict[str, dict[str, str]]:
+    """Read a flat INI file into {section: {key: value}}.
+
+    Supports "[section]" headers, "key = value" / "key: value" pairs and
+    full-line "#" / ";" comments. Keys are lowercased, as in configparser.
+    """
+    sections: dict[str, dict[str, str]] = {}
+    current: dict[str, str] | None = None
+
+    with open(path, encoding="utf-8") as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line[0] == "[" and line[-1] == "]":
+                current = sections.setdefault(line[1:-1].strip(), {})
+                continue
+            if current is None:
+                raise ValueError(f"Key outside of a section in {path}: {line!r}")
+            eq = line.find("=")
+            colon = line.find(":")
+            if eq == -1 or (colon != -1 and colon < eq):
+                eq = colon
+            if eq == -1:
+                raise ValueError(f"Malformed line in {path}: {line!r}")
+            current[line[:eq].strip().lower()] = line[eq + 1:].strip()
+
+    return sections
 
 
 def _load_config(path: Path) -> AppConfig:
     """Parse config.ini and return AppConfig with defaults for missing values."""
-    parser = configparser.ConfigParser()
-
     if path.exists():
-        parser.read(path, encoding="utf-8")
+        values = _parse_ini(path)
         logger.info("Configuration loaded from %s", path)
     else:
         logger.warning("Config file not found at %s, using defaults", path)
         return AppConfig()
 
     def get(section: str, key: str, fallback: str | None = None) -> str | None:
-        return parser.get(section, key, fallback=fallback)
+        return values.get(section, {}).get(key, fallback)
 
     def getint(section: str, key: str, fallback: int = 0) -> int:
-        return parser.getint(section, key, fallback=fallback)
+        raw = get(section, key)
+        return fallback if raw is None else int(raw)
 
     def getfloat(section: str, key: str, fallback: float = 0.0) -> float:
-        return parser.getfloat(section, key, fallback=fallback)
+        raw = get(section, key)
+        return fallback if raw is None else float(raw)
 
     def getbool(section: str, key: str, fallback: bool = False) -> bool:
-        return parser.getboolean(section, key, fallback=fallback)
+        raw = get(section, key)
+        if raw is None:
+            return fallback
+        raw = raw.lower()
+        if raw in _TRUE_VALUES:
+            return True
+        if raw in _FALSE_VALUES:
+            return False
+        raise ValueError(f"Not a boolean: [{section}] {key} = {raw!r}")
 
     languages_raw = get("ocr", "languages", "uk,en")
-    languages = [lang.strip() for lang in languages_raw.split(",")]
+    languages = tuple(lang for lang in map(str.strip, languages_raw.split(",")) if lang)
 
     return AppConfig(
         server_host=get("server", "host", "0.0.0.0"),
@@ -84,13 +140,20 @@ def _load_config(path: Path) -> AppConfig:
         ollama_num_predict=getint("ollama", "num_predict", 4096),
         ollama_repeat_penalty=getfloat("ollama", "repeat_penalty", 1.3),
         ollama_repeat_last_n=getint("ollama", "repeat_last_n", 256),
+        ollama_keep_alive=get("ollama", "keep_alive", "30m"),
+        ollama_extraction_think=getbool("ollama", "extraction_think", False),
         ocr_languages=languages,
         ocr_use_gpu=getbool("ocr", "use_gpu", False),
         max_upload_size_mb=getint("processing", "max_upload_size_mb", 50),
+        upload_chunk_size_kb=getint("processing", "upload_chunk_size_kb", 1024),
         max_total_tokens_estimate=getint("processing", "max_total_tokens_estimate", 60000),
         prompt_file=get("processing", "prompt_file", "prompts/analysis_prompt.txt"),
         extraction_prompt_file=get("processing", "extraction_prompt_file", "prompts/extraction_prompt.txt"),
         report_prompt_file=get("processing", "report_prompt_file", "prompts/report_prompt.txt"),
+        tokenizer_file=get("processing", "tokenizer_file", "models/o200k_base.tiktoken"),
+        llm_cache_enabled=getbool("cache", "enabled", True),
+        llm_cache_dir=get("cache", "llm_cache_dir", "cache/llm"),
+        llm_cache_ttl_seconds=getint("cache", "llm_cache_ttl_seconds", 86400),
     )
 
 
@@ -1,5 +1,6 @@
 """FastAPI application: lifespan, middleware, and route registration."""
 
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -8,8 +9,10 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_config
 from app.routers.analyze import router as analyze_router
-from app.services.image_extractor import init_ocr_engine
-from app.services.llm_client import check_ollama_health
+from app.services.image_extractor import init_ocr_engine, warmup_ocr_engine
+from app.services.llm_cache import close_llm_cache, init_llm_cache
+from app.services.llm_client import check_ollama_health, close_http_client, init_http_client
+from app.utils.text_utils import TOKENIZER_ENCODING, init_tokenizer, tokenizer_available
 
 # Налаштування логування
 logging.basicConfig(
@@ -24,6 +27,7 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Application lifespan: initialize resources at startup, clean up on shutdown."""
     config = get_config()
+    app.state.config = config
     logger.info("Starting Counterparty Financial Analyzer service")
     logger.info("Server: %s:%d", config.server_host, config.server_port)
     logger.info("Ollama: %s (model: %s)", config.ollama_base_url, config.ollama_model)
@@ -31,10 +35,20 @@ async def lifespan(app: FastAPI):
     # Ініціалізація OCR-движка при старті (завантаження моделі)
     try:
         init_ocr_engine(config)
+        warmup_ocr_engine()
     except Exception as e:
         logger.error("Failed to initialize OCR engine: %s", e, exc_info=True)
         logger.warning("OCR features will not be available. Image and scanned PDF processing will fail.")
 
+    init_llm_cache(config)
+
+    # Токенізатор — з локального файлу, без завантажень з мережі
+    if not await asyncio.to_thread(init_tokenizer, config):
+        logger.warning("Token limits will be enforced with a length-based estimate.")
+
+    # Спільний HTTP-клієнт для Ollama; перевірка здоров'я одразу прогріває з'єднання
+    app.state.http = init_http_client(config)
+
     # Перевірка з'єднання з Ollama
     ollama_status = await check_ollama_health(config)
     if ollama_status["ollama_reachable"]:
@@ -53,6 +67,8 @@ async def lifespan(app: FastAPI):
     yield
 
     logger.info("Shutting down Counterparty Financial Analyzer service")
+    await close_http_client()
+    close_llm_cache()
 
 
 app = FastAPI(
@@ -85,4 +101,8 @@ async def health_check():
         "service": "counterparty-financial-analyzer",
         "version": "1.0.0",
         "ollama": ollama_status,
+        "tokenizer": {
+            "encoding": TOKENIZER_ENCODING,
+            "available": tokenizer_available(),
+        },
     }
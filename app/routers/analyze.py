@@ -5,20 +5,37 @@ Step 2: Python calculates all financial coefficients
 Step 3: LLM generates HTML report from pre-calculated data
 """
 
+import asyncio
+import io
 import json
 import logging
 import time
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from fastapi.responses import ORJSONResponse
 
 from app.auth import verify_api_key
-from app.config import AppConfig, get_config
-from app.services.extractor import ALLOWED_EXTENSIONS, extract_text, is_allowed_extension
+from app.config import get_config
+from app.services.extractor import (
+    ALLOWED_EXTENSIONS,
+    ALLOWED_EXTENSIONS_TEXT,
+    IMAGE_EXTENSIONS,
+    extract_text_cached,
+    get_extension,
+)
+from app.services.image_extractor import get_ocr_semaphore
 from app.services.financial_calculator import CalculationResult, calculate_all
-from app.services.json_extractor import ExtractionError, parse_llm_json
-from app.services.llm_client import query_ollama_json, query_ollama_report
-from app.utils.text_utils import combine_extracted_texts, estimate_tokens, truncate_text
+from app.services.json_extractor import parse_llm_json
+from app.services.llm_client import (
+    InvalidLLMResponse,
+    OllamaBusyError,
+    query_ollama_json,
+    query_ollama_report,
+)
+from app.utils.text_utils import combine_and_truncate
 
 logger = logging.getLogger(__name__)
 
@@ -27,51 +44,79 @@ router = APIRouter(prefix="/api/v1", tags=["analysis"])
 MAX_FILES = 10
 
 
-def _load_prompt(path_str: str) -> str:
-    """Load a prompt template file."""
+# Маркери, що відділяють системну частину промпту від даних
+EXTRACTION_MARKER = "--- ДОКУМЕНТИ ---"
+REPORT_MARKER = "--- РОЗРАХУНКИ ---"
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """Prompt template pre-split at its data marker."""
+
+    text: str
+    system: str
+    has_marker: bool
+
+
+@lru_cache(maxsize=8)
+def _load_prompt(path_str: str, marker: str) -> PromptTemplate:
+    """Load a prompt template file and split it at the marker (cached)."""
     prompt_path = Path(path_str)
     if not prompt_path.is_absolute():
         prompt_path = Path(__file__).parent.parent.parent / prompt_path
     if not prompt_path.exists():
         raise RuntimeError(f"Prompt template not found: {prompt_path}")
-    return prompt_path.read_text(encoding="utf-8")
+    text = prompt_path.read_text(encoding="utf-8")
+    # System prompt is the part before the marker
+    system, sep, _ = text.partition(marker)
+    if not sep:
+        return PromptTemplate(text=text, system="", has_marker=False)
+    return PromptTemplate(text=text, system=system.strip(), has_marker=True)
 
 
 def _format_calculations_for_llm(calc: CalculationResult) -> str:
     """Format CalculationResult as text for LLM report generation."""
-    lines = []
-    lines.append(f"Компанія: {calc.company_name}")
-    lines.append(f"Період: {calc.period}")
-    lines.append("")
+    buf = io.StringIO()
+    write = buf.write
+    write(f"Компанія: {calc.company_name}\nПеріод: {calc.period}\n\n")
 
     for i, section in enumerate(calc.sections, 1):
-        lines.append(f"{i}. {section.title}")
+        write(f"{i}. {section.title}\n")
         if not section.rows:
-            lines.append("   (немає даних для розрахунку)")
+            write("   (немає даних для розрахунку)\n")
         for row in section.rows:
-            result_str = f"{row.result}" if isinstance(row.result, str) else f"{row.result:.4f}"
-            lines.append(
+            result = row.result
+            result_str = result if isinstance(result, str) else format(result, ".4f")
+            write(
                 f"   - {row.name}: {row.formula} = {result_str} "
-                f"[{row.rating}:{row.rating_label}] (норма: {row.norm})"
+                f"[{row.rating}:{row.rating_label}] (норма: {row.norm})\n"
             )
-        lines.append("")
+        write("\n")
 
     if calc.limitations:
-        lines.append("ОБМЕЖЕННЯ:")
+        write("ОБМЕЖЕННЯ:")
         for lim in calc.limitations:
-            lines.append(f"   - {lim.indicator}: {lim.reason} ({lim.missing_rows})")
+            write(f"\n   - {lim.indicator}: {lim.reason} ({lim.missing_rows})")
     else:
-        lines.append("ОБМЕЖЕННЯ: немає — усі показники розраховано.")
+        write("ОБМЕЖЕННЯ: немає — усі показники розраховано.")
+
+    return buf.getvalue()
+
 
-    return "\n".join(lines)
+async def _extract_file(filename: str, content: bytes, ext: str) -> str:
+    """Extract text in a worker thread; image OCR is bounded by the OCR semaphore."""
+    if ext in IMAGE_EXTENSIONS:
+        # Зображення чекають на семафорі в event loop, а не займають потоки пулу
+        async with get_ocr_semaphore():
+            return await asyncio.to_thread(extract_text_cached, filename, content, ext)
+    return await asyncio.to_thread(extract_text_cached, filename, content, ext)
 
 
-@router.post("/analyze")
+@router.post("/analyze", response_class=ORJSONResponse)
 async def analyze_documents(
     files: list[UploadFile] = File(...),
     user_instructions: str = Form(""),
     _api_key: str = Depends(verify_api_key),
-    config: AppConfig = Depends(get_config),
 ):
     """Accept uploaded documents, extract text, and return LLM financial analysis.
 
@@ -82,6 +127,7 @@ async def analyze_documents(
       4. LLM generates HTML report
     """
     start_time = time.time()
+    config = get_config()
 
     # --- File validation ---
     if len(files) < 1 or len(files) > MAX_FILES:
@@ -90,40 +136,57 @@ async def analyze_documents(
             detail=f"Please upload between 1 and {MAX_FILES} files. Received: {len(files)}",
         )
 
+    extensions: list[str] = []
     for f in files:
-        if not is_allowed_extension(f.filename or ""):
-            allowed = ", ".join(sorted(ALLOWED_EXTENSIONS))
+        ext = get_extension(f.filename or "")
+        if ext not in ALLOWED_EXTENSIONS:
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"Unsupported file type: '{f.filename}'. Allowed: {allowed}",
+                detail=f"Unsupported file type: '{f.filename}'. Allowed: {ALLOWED_EXTENSIONS_TEXT}",
             )
+        extensions.append(ext)
 
     # --- Read files and check size ---
     max_size = config.max_upload_size_mb * 1024 * 1024
-    file_data: list[tuple[str, bytes]] = []
+    chunk_size = config.upload_chunk_size_kb * 1024
+    file_data: list[tuple[str, bytes, str]] = []
     total_size = 0
 
-    for f in files:
-        content = await f.read()
-        total_size += len(content)
-        if total_size > max_size:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"Total upload size exceeds {config.max_upload_size_mb} MB limit",
-            )
-        file_data.append((f.filename or "unknown", content))
+    for f, ext in zip(files, extensions):
+        # Читаємо частинами, щоб не тримати в пам'яті файли понад ліміт
+        buf = bytearray()
+        while chunk := await f.read(chunk_size):
+            total_size += len(chunk)
+            if total_size > max_size:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Total upload size exceeds {config.max_upload_size_mb} MB limit",
+                )
+            buf.extend(chunk)
+        file_data.append((f.filename or "unknown", bytes(buf), ext))
+        # Завантаження вже скопійоване — звільняємо тимчасовий файл одразу
+        await f.close()
+    del buf, chunk
 
     # --- Extract text from each file ---
     file_texts: dict[str, str] = {}
     failed_files: list[dict] = []
 
-    for filename, content in file_data:
-        try:
-            text = extract_text(filename, content)
-            file_texts[filename] = text
-        except Exception as e:
-            logger.error("Failed to extract text from '%s': %s", filename, e, exc_info=True)
-            failed_files.append({"filename": filename, "error": str(e)})
+    # Файли незалежні — витягуємо текст паралельно у пулі потоків
+    filenames = [filename for filename, _, _ in file_data]
+    tasks = [_extract_file(filename, content, ext) for filename, content, ext in file_data]
+    # Байти файлів тепер тримають лише задачі — кожен буфер звільняється,
+    # щойно його задача завершиться, а не після запитів до LLM
+    file_data.clear()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    del tasks
+
+    for filename, result in zip(filenames, results):
+        if isinstance(result, BaseException):
+            logger.error("Failed to extract text from '%s': %s", filename, result, exc_info=result)
+            failed_files.append({"filename": filename, "error": str(result)})
+        else:
+            file_texts[filename] = result
 
     if not file_texts:
         raise HTTPException(
@@ -135,15 +198,12 @@ async def analyze_documents(
         )
 
     # --- Combine texts ---
-    combined_text = combine_extracted_texts(file_texts)
-    tokens_estimated = estimate_tokens(combined_text)
+    # Токенізація кількох МБ тексту — CPU-робота, поза event loop
+    combined_text, was_truncated, tokens_estimated = await asyncio.to_thread(
+        combine_and_truncate, file_texts, config.max_total_tokens_estimate,
+    )
     logger.info("Combined text: %d characters, ~%d tokens", len(combined_text), tokens_estimated)
 
-    was_truncated = False
-    if tokens_estimated > config.max_total_tokens_estimate:
-        combined_text, was_truncated = truncate_text(combined_text, config.max_total_tokens_estimate)
-        tokens_estimated = estimate_tokens(combined_text)
-
     # =====================================================
     # STEP 1: LLM extracts row values → JSON
     # =====================================================
@@ -151,40 +211,40 @@ async def analyze_documents(
     logger.info("=== STEP 1: Data extraction (LLM → JSON) ===")
 
     try:
-        extraction_prompt = _load_prompt(config.extraction_prompt_file)
+        extraction_prompt = _load_prompt(config.extraction_prompt_file, EXTRACTION_MARKER)
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=f"Extraction prompt error: {e}")
 
     # Build the extraction request
-    extraction_user_content = extraction_prompt.replace("{documents}", combined_text)
-
-    # System prompt is the part before "--- ДОКУМЕНТИ ---"
-    extraction_system = ""
-    if "--- ДОКУМЕНТИ ---" in extraction_prompt:
-        extraction_system = extraction_prompt.split("--- ДОКУМЕНТИ ---")[0].strip()
-        extraction_user_content = f"--- ДОКУМЕНТИ ---\n{combined_text}"
-
-    try:
-        raw_json_response = await query_ollama_json(extraction_system, extraction_user_content, config)
-    except Exception as e:
-        logger.error("Step 1 failed (LLM extraction): %s", e, exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Data extraction failed: {e}")
-
-    step1_time = round(time.time() - step1_start, 2)
-    logger.info("Step 1 completed in %.2fs, response: %d chars", step1_time, len(raw_json_response))
+    extraction_system = extraction_prompt.system
+    if extraction_prompt.has_marker:
+        extraction_user_content = f"{EXTRACTION_MARKER}\n{combined_text}"
+    else:
+        extraction_user_content = extraction_prompt.text.replace("{documents}", combined_text)
 
-    # Parse JSON response
+    # Парсинг у клієнті: у кеш потрапляють лише відповіді, які parse_llm_json прийняв
     try:
-        extracted_data = parse_llm_json(raw_json_response)
-    except ExtractionError as e:
-        logger.error("Step 1 JSON parsing failed: %s", e)
+        extracted_data = await query_ollama_json(
+            extraction_system, extraction_user_content, config, parse=parse_llm_json,
+        )
+    except InvalidLLMResponse as e:
+        logger.error("Step 1 JSON parsing failed: %s", e.__cause__)
         raise HTTPException(
             status_code=500,
             detail={
-                "message": f"Failed to parse extracted data: {e}",
-                "raw_response_preview": raw_json_response[:1000] if raw_json_response else "",
+                "message": f"Failed to parse extracted data: {e.__cause__}",
+                "raw_response_preview": e.content[:1000] if e.content else "",
             },
         )
+    except OllamaBusyError as e:
+        logger.warning("Step 1 rejected: %s", e)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"LLM is busy: {e}")
+    except Exception as e:
+        logger.error("Step 1 failed (LLM extraction): %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Data extraction failed: {e}")
+
+    step1_time = round(time.time() - step1_start, 2)
+    logger.info("Step 1 completed in %.2fs", step1_time)
 
     # =====================================================
     # STEP 2: Python calculates all coefficients
@@ -205,23 +265,25 @@ async def analyze_documents(
     logger.info("=== STEP 3: Report generation (LLM → HTML) ===")
 
     try:
-        report_prompt = _load_prompt(config.report_prompt_file)
+        report_prompt = _load_prompt(config.report_prompt_file, REPORT_MARKER)
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=f"Report prompt error: {e}")
 
     # Build report request
-    report_system = ""
-    if "--- РОЗРАХУНКИ ---" in report_prompt:
-        report_system = report_prompt.split("--- РОЗРАХУНКИ ---")[0].strip()
-        report_user_content = f"--- РОЗРАХУНКИ ---\n{calculations_text}"
+    report_system = report_prompt.system
+    if report_prompt.has_marker:
+        report_user_content = f"{REPORT_MARKER}\n{calculations_text}"
     else:
-        report_user_content = report_prompt.replace("{calculations}", calculations_text)
+        report_user_content = report_prompt.text.replace("{calculations}", calculations_text)
 
     if user_instructions.strip():
         report_user_content += f"\n\n--- ДОДАТКОВІ ІНСТРУКЦІЇ ---\n{user_instructions.strip()}"
 
     try:
         report_html = await query_ollama_report(report_system, report_user_content, config)
+    except OllamaBusyError as e:
+        logger.warning("Step 3 rejected: %s", e)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"LLM is busy: {e}")
     except Exception as e:
         logger.error("Step 3 failed (report generation): %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Report generation failed: {e}")
@@ -258,4 +320,4 @@ async def analyze_documents(
     if was_truncated:
         response["warning"] = "Document text was truncated due to token limit"
 
-    return response
+    return ORJSONResponse(response)
@@ -1,15 +1,40 @@
-"""Word (.docx) document text extraction using python-docx.
+"""Word (.docx) document text extraction by streaming word/document.xml.
 
-Extracts all paragraphs and tables.
+Extracts all body paragraphs and top-level tables with lxml iterparse,
+without building the python-docx object graph.
 """
 
 import io
 import logging
+import zipfile
 
-from docx import Document
+from lxml import etree
 
 logger = logging.getLogger(__name__)
 
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_P = _W + "p"
+_T = _W + "t"
+_TAB = _W + "tab"
+_BR = _W + "br"
+_CR = _W + "cr"
+_TC = _W + "tc"
+_TR = _W + "tr"
+_TBL = _W + "tbl"
+_GRID_SPAN = _W + "gridSpan"
+_GRID_BEFORE = _W + "gridBefore"
+_V_MERGE = _W + "vMerge"
+_VAL = _W + "val"
+
+
+def _release(el) -> None:
+    """Free a processed element and its already-processed preceding siblings."""
+    el.clear()
+    parent = el.getparent()
+    if parent is not None:
+        while el.getprevious() is not None:
+            del parent[0]
+
 
 def extract_text_from_docx(file_bytes: bytes) -> str:
     """Extract text from a Word document.
@@ -20,28 +45,111 @@ def extract_text_from_docx(file_bytes: bytes) -> str:
     Returns:
         Text from all paragraphs and tables.
     """
-    doc = Document(io.BytesIO(file_bytes))
-    parts = []
-
-    # Витягнути текст з усіх параграфів
-    for para in doc.paragraphs:
-        text = para.text.strip()
-        if text:
-            parts.append(text)
-
-    # Витягнути текст з таблиць
-    for table_idx, table in enumerate(doc.tables):
-        table_lines = [f"--- Table {table_idx + 1} ---"]
-        for row in table.rows:
-            cells = [cell.text.strip() for cell in row.cells]
-            table_lines.append("\t".join(cells))
-        parts.append("\n".join(table_lines))
-
-    result = "\n".join(parts)
+    paragraphs: list[str] = []
+    tables: list[str] = []
+    paragraph_count = 0
+
+    table_depth = 0
+    para_depth = 0
+    run_text: list[str] = []
+    cell_paras: list[str] = []
+    row_cells: list[str] = []
+    table_lines: list[str] = []
+    # Текст комірок за позиціями сітки: поточний і попередній рядок (для vMerge)
+    row_grid: list[str] = []
+    prev_grid: list[str] = []
+    cell_span = 1
+    cell_continue = False
+
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as zf, zf.open("word/document.xml") as xml:
+        # Завантажений користувачем XML: без розгортання зовнішніх сутностей і мережі
+        for event, el in etree.iterparse(
+            xml,
+            events=("start", "end"),
+            tag=(_P, _T, _TAB, _BR, _CR, _TC, _TR, _TBL, _GRID_SPAN, _GRID_BEFORE, _V_MERGE),
+            resolve_entities=False,
+            no_network=True,
+        ):
+            tag = el.tag
+            if event == "start":
+                if tag == _P:
+                    para_depth += 1
+                    if para_depth == 1:
+                        run_text = []
+                elif tag == _TBL:
+                    table_depth += 1
+                    if table_depth == 1:
+                        table_lines = [f"--- Table {len(tables) + 1} ---"]
+                        prev_grid = []
+                elif tag == _TR and table_depth == 1:
+                    row_cells = []
+                    row_grid = []
+                elif tag == _TC and table_depth == 1:
+                    cell_paras = []
+                    cell_span = 1
+                    cell_continue = False
+                continue
+
+            if table_depth == 1 and para_depth == 0:
+                if tag == _GRID_SPAN:
+                    cell_span = max(int(el.get(_VAL, "1")), 1)
+                    continue
+                if tag == _V_MERGE:
+                    # Без w:val — продовження об'єднання (як і "continue")
+                    cell_continue = el.get(_VAL, "continue") == "continue"
+                    continue
+                if tag == _GRID_BEFORE:
+                    # Пропущені на початку рядка позиції сітки не дають комірок
+                    row_grid = [""] * int(el.get(_VAL, "0"))
+                    continue
+
+            # Текст збираємо лише з параграфів верхнього рівня (без вкладених написів)
+            if para_depth == 1 and table_depth <= 1:
+                if tag == _T:
+                    run_text.append(el.text or "")
+                elif tag == _TAB:
+                    run_text.append("\t")
+                elif tag == _BR or tag == _CR:
+                    run_text.append("\n")
+
+            if tag == _P:
+                para_depth -= 1
+                if para_depth == 0:
+                    if table_depth == 0:
+                        paragraph_count += 1
+                        text = "".join(run_text).strip()
+                        if text:
+                            paragraphs.append(text)
+                    elif table_depth == 1:
+                        cell_paras.append("".join(run_text))
+                    _release(el)
+            elif tag == _TC and table_depth == 1:
+                # Як python-docx row.cells: комірка повторюється для кожної колонки gridSpan,
+                # продовження вертикального об'єднання бере текст комірки вище
+                start = len(row_grid)
+                if cell_continue:
+                    above = prev_grid[start:start + cell_span]
+                    texts = above + [""] * (cell_span - len(above))
+                else:
+                    texts = ["\n".join(cell_paras).strip()] * cell_span
+                row_grid.extend(texts)
+                row_cells.extend(texts)
+                _release(el)
+            elif tag == _TR and table_depth == 1:
+                table_lines.append("\t".join(row_cells))
+                prev_grid = row_grid
+                _release(el)
+            elif tag == _TBL:
+                table_depth -= 1
+                if table_depth == 0:
+                    tables.append("\n".join(table_lines))
+                    _release(el)
+
+    result = "\n".join(paragraphs + tables)
     logger.info(
         "DOCX extraction completed: %d paragraphs, %d tables, %d characters",
-        len(doc.paragraphs),
-        len(doc.tables),
+        paragraph_count,
+        len(tables),
         len(result),
     )
     return result
@@ -1,15 +1,31 @@
-"""Excel (.xlsx) text extraction using openpyxl.
+"""Excel (.xlsx) text extraction using python-calamine.
 
-Iterates all sheets and rows, joining cell values as tab-separated text.
+Iterates all sheets and rows, writing cell values as tab-separated text.
+Tabs and line breaks inside a cell become spaces so every row stays on one
+line; all other characters (quotes, backslashes) are kept as is.
 """
 
 import io
 import logging
 
-from openpyxl import load_workbook
+from python_calamine import CalamineWorkbook
 
 logger = logging.getLogger(__name__)
 
+# Табуляція та переноси рядків у комірці ламали б TSV-структуру
+_CELL_WS_TRANSLATION = str.maketrans("\t\r\n", "   ")
+
+
+def _cell_to_str(cell) -> str:
+    """Format a cell value; integral floats are shown without ".0" as in openpyxl."""
+    if cell is None or cell == "":
+        return ""
+    if isinstance(cell, str):
+        return cell.translate(_CELL_WS_TRANSLATION)
+    if isinstance(cell, float) and cell.is_integer():
+        return str(int(cell))
+    return str(cell)
+
 
 def extract_text_from_excel(file_bytes: bytes) -> str:
     """Extract text from an Excel file.
@@ -20,26 +36,30 @@ def extract_text_from_excel(file_bytes: bytes) -> str:
     Returns:
         Text representation of all sheets, rows, and cells.
     """
-    wb = load_workbook(filename=io.BytesIO(file_bytes), read_only=True, data_only=True)
-    parts = []
+    wb = CalamineWorkbook.from_filelike(io.BytesIO(file_bytes))
+    buf = io.StringIO()
+    write = buf.write
+    # Локальне посилання — дешевший виклик у внутрішньому циклі
+    cell_to_str = _cell_to_str
 
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-        sheet_lines = [f"--- Sheet: {sheet_name} ---"]
+    for sheet_idx, sheet_name in enumerate(wb.sheet_names):
+        ws = wb.get_sheet_by_name(sheet_name)
+        if sheet_idx:
+            buf.write("\n")
+        buf.write(f"--- Sheet: {sheet_name} ---\n")
+        row_count = 0
 
-        for row in ws.iter_rows(values_only=True):
-            # Перетворити кожну комірку в рядок, пропустити None
-            cells = [str(cell) if cell is not None else "" for cell in row]
-            line = "\t".join(cells)
+        for row in ws.to_python(skip_empty_area=False):
+            # Перетворити кожну комірку в рядок, порожні — як ""
+            line = "\t".join(map(cell_to_str, row))
             # Пропускати повністю порожні рядки
             if line.strip():
-                sheet_lines.append(line)
-
-        parts.append("\n".join(sheet_lines))
-        logger.debug("Sheet '%s': extracted %d rows", sheet_name, len(sheet_lines) - 1)
+                write(line)
+                write("\n")
+                row_count += 1
 
-    wb.close()
+        logger.debug("Sheet '%s': extracted %d rows", sheet_name, row_count)
 
-    result = "\n\n".join(parts)
-    logger.info("Excel extraction completed: %d sheets, %d characters", len(wb.sheetnames), len(result))
+    result = buf.getvalue().rstrip("\n")
+    logger.info("Excel extraction completed: %d sheets, %d characters", len(wb.sheet_names), len(result))
     return result
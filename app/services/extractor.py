@@ -1,8 +1,11 @@
 """File type dispatcher: detects file type by extension and calls the correct extractor."""
 
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 
-from app.services.image_extractor import extract_text_from_image, get_ocr_func
+from app.services.image_extractor import extract_text_from_image, get_ocr_func_batch
 from app.services.pdf_extractor import extract_text_from_pdf
 from app.services.excel_extractor import extract_text_from_excel
 from app.services.docx_extractor import extract_text_from_docx
@@ -13,16 +16,27 @@ logger = logging.getLogger(__name__)
 # Дозволені розширення файлів
 ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".xlsx", ".docx"}
 
+# Відсортований перелік для повідомлень про помилки
+ALLOWED_EXTENSIONS_TEXT = ", ".join(sorted(ALLOWED_EXTENSIONS))
+
 IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
 
+# Кеш витягнутого тексту за хешем вмісту файлу (LRU)
+TEXT_CACHE_SIZE = 128
+
+_text_cache: OrderedDict[bytes, str] = OrderedDict()
+_text_cache_lock = threading.Lock()
+# Блокування на ключ: однакові файли, що обробляються одночасно, витягуються один раз
+_key_locks: dict[bytes, threading.Lock] = {}
+
 
 def is_allowed_extension(filename: str) -> bool:
     """Check if file extension is supported."""
-    ext = _get_extension(filename)
+    ext = get_extension(filename)
     return ext in ALLOWED_EXTENSIONS
 
 
-def _get_extension(filename: str) -> str:
+def get_extension(filename: str) -> str:
     """Extract lowercase extension from filename."""
     dot_idx = filename.rfind(".")
     if dot_idx == -1:
@@ -30,12 +44,13 @@ def _get_extension(filename: str) -> str:
     return filename[dot_idx:].lower()
 
 
-def extract_text(filename: str, file_bytes: bytes) -> str:
+def extract_text(filename: str, file_bytes: bytes, ext: str | None = None) -> str:
     """Extract text from a file based on its extension.
 
     Args:
         filename: Original filename (used to detect type).
         file_bytes: Raw file content.
+        ext: Lowercase extension if already known (skips re-detection).
 
     Returns:
         Extracted and cleaned text.
@@ -43,11 +58,12 @@ def extract_text(filename: str, file_bytes: bytes) -> str:
     Raises:
         ValueError: If file extension is not supported.
     """
-    ext = _get_extension(filename)
+    if ext is None:
+        ext = get_extension(filename)
     logger.info("Extracting text from '%s' (extension: %s, size: %d bytes)", filename, ext, len(file_bytes))
 
     if ext == ".pdf":
-        raw_text = extract_text_from_pdf(file_bytes, get_ocr_func())
+        raw_text = extract_text_from_pdf(file_bytes, get_ocr_func_batch())
     elif ext in IMAGE_EXTENSIONS:
         raw_text = extract_text_from_image(file_bytes)
     elif ext == ".xlsx":
@@ -55,8 +71,46 @@ def extract_text(filename: str, file_bytes: bytes) -> str:
     elif ext == ".docx":
         raw_text = extract_text_from_docx(file_bytes)
     else:
-        raise ValueError(f"Unsupported file extension: {ext}")
+        raise ValueError(f"Unsupported file extension: {ext}. Allowed: {ALLOWED_EXTENSIONS_TEXT}")
 
     cleaned = clean_text(raw_text)
     logger.info("Extraction complete for '%s': %d characters", filename, len(cleaned))
     return cleaned
+
+
+def extract_text_cached(filename: str, file_bytes: bytes, ext: str | None = None) -> str:
+    """Same as extract_text(), memoized by a BLAKE2b hash of the file content.
+
+    Re-uploaded or duplicate files skip extraction (and OCR) entirely.
+    Safe to call from several worker threads at once.
+    """
+    if ext is None:
+        ext = get_extension(filename)
+    key = hashlib.blake2b(file_bytes, digest_size=16).digest() + ext.encode()
+
+    with _text_cache_lock:
+        cached = _text_cache.get(key)
+        if cached is not None:
+            _text_cache.move_to_end(key)
+            logger.info("Extraction cache hit for '%s'", filename)
+            return cached
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        with _text_cache_lock:
+            cached = _text_cache.get(key)
+        if cached is not None:
+            logger.info("Extraction cache hit for '%s'", filename)
+            return cached
+
+        try:
+            text = extract_text(filename, file_bytes, ext)
+            with _text_cache_lock:
+                _text_cache[key] = text
+                if len(_text_cache) > TEXT_CACHE_SIZE:
+                    _text_cache.popitem(last=False)
+        finally:
+            with _text_cache_lock:
+                _key_locks.pop(key, None)
+
+    return text
@@ -4,9 +4,15 @@ Supports Ukrainian/Cyrillic text out of the box.
 The OCR engine is initialized once and reused across requests.
 """
 
+import asyncio
 import io
 import logging
-from typing import Callable
+import os
+import threading
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, NamedTuple
 
 import numpy as np
 from PIL import Image
@@ -17,11 +23,31 @@ from app.config import AppConfig
 logger = logging.getLogger(__name__)
 
 _ocr_engine: PaddleOCR | None = None
+# PaddleOCR predict() is not thread-safe; files are extracted concurrently
+_ocr_lock = threading.Lock()
+
+# Максимальна кількість зображень в одному виклику predict()
+OCR_BATCH_SIZE = 8
+
+# Обмеження одночасних OCR-задач з event loop: на GPU друге місце дозволяє
+# декодувати наступне зображення, поки попереднє розпізнається
+_ocr_permits = 1
+_ocr_semaphore: asyncio.Semaphore | None = None
+
+
+class RawImage(NamedTuple):
+    """Uncompressed pixel buffer (e.g. PyMuPDF pixmap samples) for OCR."""
+
+    samples: bytes
+    width: int
+    height: int
+    stride: int
+    mode: str = "L"
 
 
 def init_ocr_engine(config: AppConfig) -> None:
     """Initialize PaddleOCR engine (call once at startup)."""
-    global _ocr_engine
+    global _ocr_engine, _ocr_permits
     # PaddleOCR lang parameter: перша мова зі списку конфігурації
     lang = config.ocr_languages[0] if config.ocr_languages else "uk"
     device = "gpu" if config.ocr_use_gpu else "cpu"
@@ -31,9 +57,26 @@ def init_ocr_engine(config: AppConfig) -> None:
         lang=lang,
         device=device,
     )
+    _ocr_permits = 2 if config.ocr_use_gpu else 1
     logger.info("PaddleOCR engine initialized successfully")
 
 
+def warmup_ocr_engine() -> None:
+    """Run one throwaway prediction so the first request skips graph warm-up."""
+    engine = get_ocr_engine()
+    with _ocr_lock:
+        engine.predict(np.zeros((32, 32, 3), dtype=np.uint8))
+    logger.info("PaddleOCR engine warmed up")
+
+
+def get_ocr_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore bounding concurrent OCR work (created lazily)."""
+    global _ocr_semaphore
+    if _ocr_semaphore is None:
+        _ocr_semaphore = asyncio.Semaphore(_ocr_permits)
+    return _ocr_semaphore
+
+
 def get_ocr_engine() -> PaddleOCR:
     """Return the initialized OCR engine."""
     if _ocr_engine is None:
@@ -41,6 +84,24 @@ def get_ocr_engine() -> PaddleOCR:
     return _ocr_engine
 
 
+def _decode_image(image: bytes | RawImage) -> np.ndarray:
+    """Decode image bytes (or wrap a raw pixel buffer) into a uint8 array for PaddleOCR."""
+    if isinstance(image, RawImage):
+        # Сирі пікселі: без кодування/декодування PNG
+        img = Image.frombuffer(
+            image.mode, (image.width, image.height), image.samples, "raw", image.mode, image.stride, 1,
+        )
+    else:
+        img = Image.open(io.BytesIO(image))
+        # Для JPEG: декодування одразу в RGB без зайвого перетворення (no-op для інших форматів)
+        img.draft("RGB", img.size)
+    # PaddleOCR очікує 3 канали: сірі сторінки PDF, RGBA/палітрові PNG
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    # asarray не робить додаткової копії буфера, на відміну від array
+    return np.asarray(img, dtype=np.uint8)
+
+
 def ocr_from_bytes(image_bytes: bytes) -> str:
     """Extract text from image bytes using PaddleOCR.
 
@@ -51,11 +112,12 @@ def ocr_from_bytes(image_bytes: bytes) -> str:
         Extracted text with lines joined by newlines.
     """
     engine = get_ocr_engine()
-    img = np.array(Image.open(io.BytesIO(image_bytes)))
+    img = _decode_image(image_bytes)
 
     # PaddleOCR 3.4+: predict() returns list of result objects
     # Each result has "rec_texts" (list of str) and "rec_scores" (list of float)
-    results = engine.predict(img)
+    with _ocr_lock:
+        results = engine.predict(img)
 
     lines = []
     if results:
@@ -66,6 +128,46 @@ def ocr_from_bytes(image_bytes: bytes) -> str:
     return "\n".join(lines)
 
 
+def _predict_texts(engine: PaddleOCR, arrs: list[np.ndarray]) -> list[str]:
+    """Run one batched predict() and join each image's recognized lines."""
+    with _ocr_lock:
+        results = engine.predict(arrs)
+    # predict() returns one result object per input image
+    return ["\n".join(result.get("rec_texts", [])) for result in results]
+
+
+def ocr_from_bytes_batch(images: Iterable[bytes | RawImage]) -> list[str]:
+    """Extract text from several images with batched PaddleOCR calls.
+
+    Images are passed to predict() in groups of OCR_BATCH_SIZE to amortize
+    per-call overhead. While one group is being recognized, the next one is
+    pulled from the iterable (e.g. rendered by the PDF extractor) and
+    decoded, so at most two groups of bitmaps are held in memory.
+
+    Args:
+        images: Encoded image data (PNG, JPG, etc.) or RawImage pixel
+            buffers, one entry per image; may be a lazy iterator.
+
+    Returns:
+        Extracted text for each input image, in the same order.
+    """
+    engine = get_ocr_engine()
+    texts: list[str] = []
+    it = iter(images)
+
+    workers = min(OCR_BATCH_SIZE, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as decode_pool, \
+            ThreadPoolExecutor(max_workers=1) as predict_pool:
+        pending = [decode_pool.submit(_decode_image, image) for image in islice(it, OCR_BATCH_SIZE)]
+        while pending:
+            recognized = predict_pool.submit(_predict_texts, engine, [future.result() for future in pending])
+            # Наступна група рендериться й декодується, поки поточна розпізнається
+            pending = [decode_pool.submit(_decode_image, image) for image in islice(it, OCR_BATCH_SIZE)]
+            texts.extend(recognized.result())
+
+    return texts
+
+
 def extract_text_from_image(file_bytes: bytes) -> str:
     """Extract text from an image file.
 
@@ -84,3 +186,8 @@ def extract_text_from_image(file_bytes: bytes) -> str:
 def get_ocr_func() -> Callable[[bytes], str]:
     """Return the OCR function for use by other extractors (e.g. PDF fallback)."""
     return ocr_from_bytes
+
+
+def get_ocr_func_batch() -> Callable[[Iterable[bytes | RawImage]], list[str]]:
+    """Return the batched OCR function (one text per input image)."""
+    return ocr_from_bytes_batch
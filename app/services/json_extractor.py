@@ -4,10 +4,13 @@ import json
 import logging
 import re
 
+import orjson
+
 logger = logging.getLogger(__name__)
 
-# Required keys in the extracted data
-REQUIRED_KEYS = {"balance_start", "balance_end", "income_current"}
+# Required keys in the extracted data (numeric sections, in processing order)
+SECTION_KEYS = ("balance_start", "balance_end", "income_current")
+REQUIRED_KEYS = frozenset(SECTION_KEYS)
 
 # Known balance row codes
 BALANCE_CODES = {
@@ -20,6 +23,14 @@ BALANCE_CODES = {
 # Known income statement codes
 INCOME_CODES = {"2000", "2050", "2290", "2350"}
 
+_FENCE_RE = re.compile(r"```(?:json)?\s*\n?(.*?)\n?```", re.DOTALL)
+_RP_PREFIX_RE = re.compile(r"^р\.?")
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Comma decimal separator -> dot; spaces and NBSP (thousands separators) removed
+_NUMBER_TRANSLATION = str.maketrans({",": ".", " ": None, "\u00a0": None})
+
 
 class ExtractionError(Exception):
     """Raised when LLM response cannot be parsed as valid financial data."""
@@ -45,35 +56,37 @@ def parse_llm_json(raw_response: str) -> dict:
     if not raw_response or not raw_response.strip():
         raise ExtractionError("LLM повернув порожню відповідь")
 
-    # Step 1: Extract JSON from possible markdown fences or surrounding text
-    json_str = _extract_json_block(raw_response)
-
-    # Step 2: Parse JSON
+    # Step 1: Parse JSON; format=json usually yields a bare object, so try it as is
     try:
-        data = json.loads(json_str)
-    except json.JSONDecodeError as e:
-        logger.error("JSON parse error: %s", e)
-        logger.debug("Raw response (first 500 chars): %s", raw_response[:500])
-        raise ExtractionError(f"Не вдалося розпарсити JSON: {e}") from e
+        data = orjson.loads(raw_response)
+    except orjson.JSONDecodeError:
+        # Step 2: Extract JSON from possible markdown fences or surrounding text
+        json_str = _extract_json_block(raw_response)
+        try:
+            data = orjson.loads(json_str)
+        except orjson.JSONDecodeError as e:
+            logger.error("JSON parse error: %s", e)
+            logger.debug("Raw response (first 500 chars): %s", raw_response[:500])
+            raise ExtractionError(f"Не вдалося розпарсити JSON: {e}") from e
 
     if not isinstance(data, dict):
         raise ExtractionError(f"Очікувався JSON-об'єкт, отримано: {type(data).__name__}")
 
     # Step 3: Validate required keys
-    missing = REQUIRED_KEYS - set(data.keys())
+    missing = REQUIRED_KEYS - data.keys()
     if missing:
         raise ExtractionError(f"Відсутні обов'язкові ключі: {', '.join(sorted(missing))}")
 
     # Step 4: Normalize numeric values
-    for key in ("balance_start", "balance_end", "income_current"):
-        section = data.get(key, {})
+    for key in SECTION_KEYS:
+        section = data[key]
         if not isinstance(section, dict):
             raise ExtractionError(f"Ключ '{key}' має бути об'єктом, отримано: {type(section).__name__}")
         data[key] = _normalize_section(section)
 
     # Step 5: Ensure string fields
-    data.setdefault("company_name", "Невідома компанія")
-    data.setdefault("period", "—")
+    data["company_name"] = data.get("company_name") or "Невідома компанія"
+    data["period"] = data.get("period") or "—"
 
     # Log summary
     bs = data["balance_start"]
@@ -93,7 +106,7 @@ def _extract_json_block(text: str) -> str:
     text = text.strip()
 
     # Try markdown code fence: ```json ... ``` or ``` ... ```
-    fence_match = re.search(r"```(?:json)?\s*\n?(.*?)\n?```", text, re.DOTALL)
+    fence_match = _FENCE_RE.search(text)
     if fence_match:
         return fence_match.group(1).strip()
 
@@ -102,15 +115,31 @@ def _extract_json_block(text: str) -> str:
     if first_brace == -1:
         raise ExtractionError("JSON-об'єкт не знайдено у відповіді LLM")
 
-    # Find matching closing brace
+    # JSON decoder (C) finds the end of the object and handles braces in strings
+    try:
+        _, end = _JSON_DECODER.raw_decode(text, first_brace)
+        return text[first_brace:end]
+    except json.JSONDecodeError:
+        pass
+
+    # Fallback: find matching closing brace, jumping between brace positions only
     depth = 0
-    for i in range(first_brace, len(text)):
-        if text[i] == "{":
+    pos = first_brace
+    next_open = first_brace
+    while True:
+        if next_open != -1 and next_open < pos:
+            next_open = text.find("{", pos)
+        next_close = text.find("}", pos)
+        if next_close == -1:
+            break
+        if next_open != -1 and next_open < next_close:
             depth += 1
-        elif text[i] == "}":
+            pos = next_open + 1
+        else:
             depth -= 1
+            pos = next_close + 1
             if depth == 0:
-                return text[first_brace:i + 1]
+                return text[first_brace:pos]
 
     # If no matching brace found, try the whole thing from first brace
     return text[first_brace:]
@@ -126,13 +155,15 @@ def _normalize_section(section: dict) -> dict:
     for key, val in section.items():
         # Normalize key — strip "р." prefix if present
         k = str(key).strip()
-        k = re.sub(r"^р\.?", "", k).strip()
+        if not k.isdigit():
+            k = _RP_PREFIX_RE.sub("", k).strip()
         if not k.isdigit():
             logger.warning("Skipping non-numeric key: %s", key)
             continue
 
-        # Normalize value
-        numeric = _to_float(val)
+        # Normalize value — JSON numbers (the common case) need no parsing
+        val_type = type(val)
+        numeric = float(val) if val_type is float or val_type is int else _to_float(val)
         if numeric is not None:
             result[k] = numeric
         else:
@@ -149,13 +180,18 @@ def _to_float(val) -> float | None:
         s = val.strip()
         if not s or s == "-" or s.lower() == "null" or s.lower() == "none":
             return None
+        # Fast path: plain number with nothing to normalize
+        if s[0] != "(" and "," not in s and " " not in s and "\u00a0" not in s:
+            try:
+                return float(s)
+            except ValueError:
+                return None
         # Handle parentheses as negative: (123.4) -> -123.4
-        paren_match = re.match(r"^\((.+)\)$", s)
-        if paren_match:
-            inner = _to_float(paren_match.group(1))
+        if len(s) >= 2 and s[0] == "(" and s[-1] == ")":
+            inner = _to_float(s[1:-1])
             return -inner if inner is not None else None
-        # Replace comma decimal separator
-        s = s.replace(",", ".").replace(" ", "").replace("\u00a0", "")
+        # Replace comma decimal separator, drop (non-breaking) spaces
+        s = s.translate(_NUMBER_TRANSLATION)
         try:
             return float(s)
         except ValueError:
@@ -0,0 +1,84 @@
+"""Persistent cache of LLM responses (diskcache, SQLite-backed).
+
+Maps a BLAKE2b hash of everything that affects generation (model, format,
+sampling options, prompts) to the generated content, so resubmitted
+documents skip the LLM call entirely. Survives service restarts.
+"""
+
+import hashlib
+import logging
+from pathlib import Path
+
+from diskcache import Cache
+
+from app.config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+# Змінити при зміні формату запитів/відповідей, щоб інвалідувати старі записи
+CACHE_VERSION = "v2"
+
+_cache: Cache | None = None
+_ttl_seconds: int = 0
+
+
+def is_cache_enabled(config: AppConfig) -> bool:
+    """Return True if LLM responses may be stored (cache.enabled and a positive TTL)."""
+    return config.llm_cache_enabled and config.llm_cache_ttl_seconds > 0
+
+
+def init_llm_cache(config: AppConfig) -> None:
+    """Open the on-disk response cache (call once at startup)."""
+    global _cache, _ttl_seconds
+    if not is_cache_enabled(config):
+        logger.info("LLM response cache disabled")
+        return
+    cache_dir = Path(config.llm_cache_dir)
+    if not cache_dir.is_absolute():
+        cache_dir = Path(__file__).parent.parent.parent / cache_dir
+    _cache = Cache(str(cache_dir))
+    _ttl_seconds = config.llm_cache_ttl_seconds
+    logger.info("LLM response cache opened at %s (ttl=%ds)", cache_dir, _ttl_seconds)
+
+
+def close_llm_cache() -> None:
+    """Close the response cache (call on shutdown)."""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def _get_cache(config: AppConfig) -> Cache:
+    """Return the cache, opening it on first use."""
+    if _cache is None:
+        init_llm_cache(config)
+    return _cache
+
+
+def make_key(payload: dict) -> str:
+    """Hash everything in an Ollama chat payload that affects the output."""
+    options = payload["options"]
+    raw = "\x00".join((
+        CACHE_VERSION,
+        payload["model"],
+        payload.get("format", ""),
+        str(payload.get("think")),
+        repr(sorted(options.items())),
+        *(message["content"] for message in payload["messages"]),
+    ))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_cached(key: str, config: AppConfig) -> str | None:
+    """Return the cached response for key, or None on a miss or if disabled."""
+    if not is_cache_enabled(config):
+        return None
+    return _get_cache(config).get(key)
+
+
+def set_cached(key: str, content: str, config: AppConfig) -> None:
+    """Store a response under key with the configured expiry (no-op if disabled)."""
+    if not is_cache_enabled(config):
+        return
+    _get_cache(config).set(key, content, expire=_ttl_seconds)
@@ -1,17 +1,114 @@
 """Ollama LLM API client (async, with timeout and error handling).
 
 Uses the /api/chat endpoint with configurable model, context window, and temperature.
+Responses are streamed (NDJSON) and assembled incrementally.
 """
 
+import asyncio
 import json as json_module
 import logging
+from collections.abc import Callable
+from typing import Any
 
 import httpx
+import orjson
 
 from app.config import AppConfig
+from app.services.llm_cache import get_cached, make_key, set_cached
 
 logger = logging.getLogger(__name__)
 
+# Скільки запит чекає на вільне з'єднання з пулу, перш ніж отримати 503
+POOL_TIMEOUT_SECONDS = 30.0
+
+_http_client: httpx.AsyncClient | None = None
+# Окремий малий клієнт для /api/tags: потокові відповіді тримають з'єднання
+# основного пулу всю генерацію, і health-check не має за них конкурувати
+_health_client: httpx.AsyncClient | None = None
+
+
+class InvalidLLMResponse(Exception):
+    """Raised when a complete LLM response is rejected by the caller's parser.
+
+    The parser's exception is chained as __cause__; the raw text is kept
+    for diagnostics.
+    """
+
+    def __init__(self, content: str) -> None:
+        super().__init__("LLM response rejected by parser")
+        self.content = content
+
+
+class OllamaBusyError(Exception):
+    """Raised when no connection to Ollama frees up within POOL_TIMEOUT_SECONDS."""
+
+
+def init_http_client(config: AppConfig) -> httpx.AsyncClient:
+    """Create the shared keep-alive HTTP client (call once at startup).
+
+    Returns the existing client if one is already open, so a lazily created
+    client is never replaced and leaked.
+    """
+    global _http_client, _health_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                timeout=float(config.ollama_timeout), connect=30.0, pool=POOL_TIMEOUT_SECONDS,
+            ),
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=10),
+        )
+    if _health_client is None:
+        _health_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_keepalive_connections=1, max_connections=2),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP clients (call on shutdown)."""
+    global _http_client, _health_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    if _health_client is not None:
+        await _health_client.aclose()
+        _health_client = None
+
+
+def get_http_client(config: AppConfig) -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use.
+
+    No lock is needed: creation has no await point, so it cannot interleave
+    with other coroutines on the event loop.
+    """
+    if _http_client is None:
+        return init_http_client(config)
+    return _http_client
+
+
+def _get_health_client(config: AppConfig) -> httpx.AsyncClient:
+    """Return the health-check HTTP client, creating the clients on first use."""
+    if _health_client is None:
+        init_http_client(config)
+    return _health_client
+
+
+async def _aiter_ndjson_lines(response: httpx.Response):
+    """Yield non-empty NDJSON lines as raw bytes.
+
+    orjson parses bytes directly, so lines are never decoded to str.
+    """
+    pending = b""
+    async for chunk in response.aiter_bytes():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
 
 async def _send_ollama_request(
     system_prompt: str,
@@ -21,8 +118,10 @@ async def _send_ollama_request(
     num_predict_override: int | None = None,
     temperature_override: float | None = None,
     json_format: bool = False,
+    think: bool | str | None = None,
+    parse: Callable[[str], Any] | None = None,
     step_name: str = "",
-) -> str:
+) -> Any:
     """Internal: send a chat request to Ollama and return the content.
 
     Args:
@@ -32,13 +131,20 @@ async def _send_ollama_request(
         num_predict_override: Override num_predict from config.
         temperature_override: Override temperature from config.
         json_format: If True, request JSON output format from Ollama.
+        think: If set, enable/disable model thinking, or a level ("low",
+            "medium", "high") for models that take levels (omitted when None).
+        parse: Optional parser applied to the response; only responses it
+            accepts are cached, and its result is returned instead of the text.
         step_name: Label for logging (e.g. "extraction", "report").
 
     Returns:
-        LLM-generated response text.
+        LLM-generated response text, or parse(text) if parse is given.
+
+    Raises:
+        InvalidLLMResponse: If parse raises for the response.
+        OllamaBusyError: If the connection pool stays exhausted.
     """
     url = f"{config.ollama_base_url}/api/chat"
-    timeout = httpx.Timeout(timeout=float(config.ollama_timeout), connect=30.0)
 
     options = {
         "num_ctx": config.ollama_num_ctx,
@@ -54,12 +160,16 @@ async def _send_ollama_request(
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_content},
         ],
-        "stream": False,
+        "stream": True,
         "options": options,
+        # Тримати модель завантаженою між кроками extraction і report
+        "keep_alive": config.ollama_keep_alive,
     }
 
     if json_format:
         payload["format"] = "json"
+    if think is not None:
+        payload["think"] = think
 
     label = f"[{step_name}] " if step_name else ""
     logger.info(
@@ -69,11 +179,33 @@ async def _send_ollama_request(
     )
     logger.debug("%sPayload user content length: %d chars", label, len(user_content))
 
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        response = await client.post(url, json=payload)
-        response.raise_for_status()
-
-    data = response.json()
+    # Однакові запити не відправляються повторно (SQLite-кеш — поза event loop)
+    key = make_key(payload)
+    cached = await asyncio.to_thread(get_cached, key, config)
+    if cached is not None:
+        logger.info("%sOllama response served from cache: %d characters", label, len(cached))
+        return _parse_response(cached, parse)
+
+    # Потокова відповідь: кожен рядок — окремий JSON-фрагмент, останній містить метадані
+    content_parts: list[str] = []
+    thinking_parts: list[str] = []
+    data: dict = {}
+    try:
+        async with get_http_client(config).stream("POST", url, json=payload) as response:
+            response.raise_for_status()
+            async for line in _aiter_ndjson_lines(response):
+                data = orjson.loads(line)
+                if "error" in data:
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                message = data.get("message") or {}
+                if message.get("content"):
+                    content_parts.append(message["content"])
+                if message.get("thinking"):
+                    thinking_parts.append(message["thinking"])
+    except httpx.PoolTimeout as e:
+        raise OllamaBusyError(
+            f"All Ollama connections are busy (waited {POOL_TIMEOUT_SECONDS:.0f}s)"
+        ) from e
 
     # Diagnostics
     done_reason = data.get("done_reason", "unknown")
@@ -84,9 +216,8 @@ async def _send_ollama_request(
         label, done_reason, prompt_eval_count, eval_count,
     )
 
-    message = data.get("message", {})
-    content = message.get("content", "")
-    thinking = message.get("thinking", "")
+    content = "".join(content_parts)
+    thinking = "".join(thinking_parts)
 
     if thinking:
         logger.info("%sOllama thinking: %d characters", label, len(thinking))
@@ -103,7 +234,33 @@ async def _send_ollama_request(
         logger.warning("%sResponse (truncated): %s", label, json_module.dumps(data, ensure_ascii=False)[:500])
 
     logger.info("%sOllama response received: %d characters", label, len(content))
-    return content
+    # Невалідна відповідь не кешується (виняток), обрізана — теж: повторна
+    # спроба має знову звернутися до моделі
+    result = _parse_response(content, parse)
+    if content and done_reason == "stop":
+        await asyncio.to_thread(set_cached, key, content, config)
+    return result
+
+
+def _parse_response(content: str, parse: Callable[[str], Any] | None) -> Any:
+    """Apply the caller's parser, wrapping its failure in InvalidLLMResponse."""
+    if parse is None:
+        return content
+    try:
+        return parse(content)
+    except Exception as e:
+        raise InvalidLLMResponse(content) from e
+
+
+def _think_param(model: str, enabled: bool) -> bool | str:
+    """Map the think on/off setting to what the model accepts.
+
+    gpt-oss ignores boolean think and only takes levels; it cannot stop
+    thinking, so "off" becomes its lowest level.
+    """
+    if "gpt-oss" in model:
+        return "medium" if enabled else "low"
+    return enabled
 
 
 async def query_ollama(
@@ -119,11 +276,18 @@ async def query_ollama_json(
     system_prompt: str,
     user_content: str,
     config: AppConfig,
-) -> str:
+    parse: Callable[[str], Any] | None = None,
+) -> Any:
     """Send a chat request expecting JSON response.
 
     Uses lower temperature (0.1) and JSON format mode.
     num_predict is set to 4096 — sufficient for structured data extraction.
+    Thinking is disabled by default (ollama.extraction_think) so the token
+    budget goes to the JSON itself; gpt-oss models get think="low" instead,
+    as they cannot disable it.
+
+    If parse is given, its result is returned and only responses it accepts
+    are cached (see _send_ollama_request).
     """
     return await _send_ollama_request(
         system_prompt,
@@ -132,6 +296,8 @@ async def query_ollama_json(
         num_predict_override=4096,
         temperature_override=0.1,
         json_format=True,
+        think=_think_param(config.ollama_model, config.ollama_extraction_think),
+        parse=parse,
         step_name="extraction",
     )
 
@@ -160,25 +326,24 @@ async def check_ollama_health(config: AppConfig) -> dict:
         Dict with status information.
     """
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
-            # Перевірка доступності Ollama
-            resp = await client.get(f"{config.ollama_base_url}/api/tags")
-            resp.raise_for_status()
-            tags_data = resp.json()
-
-            # Перевірка наявності потрібної моделі
-            available_models = [m["name"] for m in tags_data.get("models", [])]
-            model_available = any(
-                config.ollama_model in model_name
-                for model_name in available_models
-            )
-
-            return {
-                "ollama_reachable": True,
-                "model_available": model_available,
-                "configured_model": config.ollama_model,
-                "available_models": available_models,
-            }
+        # Перевірка доступності Ollama
+        resp = await _get_health_client(config).get(f"{config.ollama_base_url}/api/tags")
+        resp.raise_for_status()
+        tags_data = orjson.loads(resp.content)
+
+        # Перевірка наявності потрібної моделі
+        available_models = [m["name"] for m in tags_data.get("models", [])]
+        model_available = any(
+            config.ollama_model in model_name
+            for model_name in available_models
+        )
+
+        return {
+            "ollama_reachable": True,
+            "model_available": model_available,
+            "configured_model": config.ollama_model,
+            "available_models": available_models,
+        }
     except httpx.ConnectError:
         return {
             "ollama_reachable": False,
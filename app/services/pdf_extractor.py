@@ -6,26 +6,39 @@ For each page:
   and run OCR on a rendered page image.
 """
 
+import io
 import logging
+from collections.abc import Iterable, Iterator
 from typing import Callable
 
 import fitz  # PyMuPDF
 
+from app.services.image_extractor import RawImage
+
 logger = logging.getLogger(__name__)
 
 # Мінімальна довжина тексту сторінки для вважання її "нативною"
 MIN_TEXT_LENGTH = 50
 
+# Роздільна здатність рендерингу сканованих сторінок для OCR (у відтінках сірого)
+OCR_DPI = 200
+
 
 def extract_text_from_pdf(
     file_bytes: bytes,
-    ocr_func: Callable[[bytes], str],
+    ocr_batch_func: Callable[[Iterable[bytes | RawImage]], list[str]],
 ) -> str:
     """Extract text from a PDF file.
 
+    Scanned pages are rendered to raw grayscale pixels (no PNG round-trip)
+    lazily, as the batched OCR function pulls them, so pages are rendered
+    while the previous batch is being recognized and only a couple of
+    batches of bitmaps are held in memory.
+
     Args:
         file_bytes: Raw PDF file content.
-        ocr_func: Function that accepts image bytes and returns OCR text.
+        ocr_batch_func: Function that accepts an iterable of images (encoded
+            bytes or RawImage) and returns OCR text for each, in order.
 
     Returns:
         Combined text from all pages.
@@ -34,29 +47,41 @@ def extract_text_from_pdf(
     total_pages = len(doc)
     logger.info("PDF opened: %d pages", total_pages)
 
-    full_text = []
-    ocr_pages = 0
-
-    for page_num, page in enumerate(doc):
-        text = page.get_text()
-
-        if len(text.strip()) < MIN_TEXT_LENGTH:
-            # Сторінка ймовірно відсканована — рендеримо як зображення та розпізнаємо
-            logger.debug(
-                "Page %d: native text too short (%d chars), falling back to OCR",
-                page_num + 1,
-                len(text.strip()),
-            )
-            pix = page.get_pixmap(dpi=300)
-            img_bytes = pix.tobytes("png")
-            text = ocr_func(img_bytes)
-            ocr_pages += 1
-
-        full_text.append(f"--- Page {page_num + 1} ---\n{text}")
-
+    page_texts: list[str] = []
+    ocr_page_indices: list[int] = []
+
+    def scanned_pages() -> Iterator[RawImage]:
+        for page_num, page in enumerate(doc):
+            text = page.get_text()
+            page_texts.append(text)
+
+            if len(text.strip()) < MIN_TEXT_LENGTH:
+                # Сторінка ймовірно відсканована — рендеримо як зображення для OCR
+                logger.debug(
+                    "Page %d: native text too short (%d chars), falling back to OCR",
+                    page_num + 1,
+                    len(text.strip()),
+                )
+                pix = page.get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY, alpha=False)
+                image = RawImage(pix.samples, pix.width, pix.height, pix.stride)
+                # Звільнити растр сторінки до yield — генератор тримає локальні змінні
+                del pix
+                ocr_page_indices.append(page_num)
+                yield image
+
+    # Генератор проходить усі сторінки; OCR-функція забирає скановані партіями
+    ocr_texts = ocr_batch_func(scanned_pages())
+    for idx, ocr_text in zip(ocr_page_indices, ocr_texts):
+        page_texts[idx] = ocr_text
     doc.close()
 
-    if ocr_pages > 0:
-        logger.info("OCR was used for %d out of %d pages", ocr_pages, total_pages)
+    if ocr_page_indices:
+        logger.info("OCR was used for %d out of %d pages", len(ocr_page_indices), total_pages)
 
-    return "\n\n".join(full_text)
+    buf = io.StringIO()
+    for page_num, text in enumerate(page_texts):
+        if page_num:
+            buf.write("\n\n")
+        buf.write(f"--- Page {page_num + 1} ---\n")
+        buf.write(text)
+    return buf.getvalue()
@@ -1,48 +1,155 @@
 """Text cleaning, truncation, and token estimation utilities."""
 
+import base64
+import hashlib
+import io
 import re
 import logging
+from pathlib import Path
+
+import tiktoken
+
+from app.config import AppConfig
 
 logger = logging.getLogger(__name__)
 
+# Лише те, що реально змінюється: 2+ пробільних символи або одиночний не-пробіл (таб тощо)
+_WS_RE = re.compile(r"[^\S\n]{2,}|[^\S\n ]")
+_NL_RE = re.compile(r"\n{3,}")
+
+# BPE-кодування для підрахунку токенів (o200k — токенізатор gpt-oss)
+TOKENIZER_ENCODING = "o200k_base"
+# SHA-256 офіційного o200k_base.tiktoken (та сама перевірка, що й у tiktoken)
+_TOKENIZER_SHA256 = "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d"
+# Правило розбиття тексту o200k_base, як у tiktoken_ext.openai_public
+_TOKENIZER_PAT_STR = "|".join((
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""\p{N}{1,3}""",
+    r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+    r"""\s*[\r\n]+""",
+    r"""\s+(?!\S)""",
+    r"""\s+""",
+))
+
+_encoder: tiktoken.Encoding | None = None
+
 
 def clean_text(text: str) -> str:
     """Remove excessive whitespace and control characters, keep Ukrainian chars."""
     # Замінити послідовності пробілів/табуляцій на один пробіл
-    text = re.sub(r"[^\S\n]+", " ", text)
+    text = _WS_RE.sub(" ", text)
     # Замінити 3+ послідовних порожніх рядків на 2
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    if "\n\n\n" in text:
+        text = _NL_RE.sub("\n\n", text)
     return text.strip()
 
 
+def init_tokenizer(config: AppConfig) -> bool:
+    """Load the tokenizer from the local BPE file (call once at startup).
+
+    Nothing is downloaded: if config.tokenizer_file is missing or is not the
+    o200k_base file, token counts use the length heuristic.
+
+    Returns:
+        True if the tokenizer is available.
+    """
+    global _encoder
+    path = Path(config.tokenizer_file)
+    if not path.is_absolute():
+        path = Path(__file__).parent.parent.parent / path
+    try:
+        data = path.read_bytes()
+        if hashlib.sha256(data).hexdigest() != _TOKENIZER_SHA256:
+            raise ValueError(f"not the {TOKENIZER_ENCODING} file (checksum mismatch)")
+        ranks: dict[bytes, int] = {}
+        for line in data.splitlines():
+            if line:
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+        _encoder = tiktoken.Encoding(
+            TOKENIZER_ENCODING,
+            pat_str=_TOKENIZER_PAT_STR,
+            mergeable_ranks=ranks,
+            special_tokens={},
+        )
+    except (OSError, ValueError) as e:
+        logger.warning(
+            "Tokenizer file %s unusable (%s): token counts use the length heuristic",
+            path, e,
+        )
+        return False
+    logger.info("Tokenizer '%s' loaded from %s", TOKENIZER_ENCODING, path)
+    return True
+
+
+def tokenizer_available() -> bool:
+    """Return True if token counts come from the tokenizer, not the heuristic."""
+    return _encoder is not None
+
+
 def estimate_tokens(text: str) -> int:
-    """Rough token estimate for Ukrainian/Cyrillic text.
+    """Count tokens with the tiktoken encoder.
 
-    Ukrainian text typically yields ~1 token per 3.5 characters
-    due to multi-byte encoding and subword tokenization.
+    Falls back to a length heuristic if the tokenizer is not loaded:
+    Ukrainian text typically yields ~1 token per 3.5 characters.
     """
     if not text:
         return 0
-    return int(len(text) / 3.5)
+    enc = _encoder
+    if enc is None:
+        return _tokens_for_length(len(text))
+    return len(enc.encode_ordinary(text))
+
+
+def _tokens_for_length(length: int) -> int:
+    """Heuristic token estimate for a text of the given length.
+
+    Integer form of length / 3.5, without a float round-trip.
+    """
+    return length * 2 // 7
+
+
+def _count_and_cut(text: str, max_tokens: int) -> tuple[int, int]:
+    """Return (token count of text, length in chars of its first max_tokens tokens)."""
+    enc = _encoder
+    if enc is None:
+        return _tokens_for_length(len(text)), max_tokens * 7 // 2
+    tokens = enc.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return len(tokens), len(text)
+    # Байти префікса токенів — це префікс UTF-8 тексту; обірваний символ відкидаємо
+    prefix = enc.decode_bytes(tokens[:max_tokens]).decode("utf-8", errors="ignore")
+    return len(tokens), len(prefix)
 
 
 def truncate_text(text: str, max_tokens: int) -> tuple[str, bool]:
-    """Truncate text to approximately max_tokens.
+    """Truncate text to at most max_tokens tokens.
+
+    Standalone helper; the analyze endpoint uses combine_and_truncate().
 
     Returns:
         Tuple of (possibly truncated text, was_truncated flag).
     """
-    current_tokens = estimate_tokens(text)
+    current_tokens, target_chars = _count_and_cut(text, max_tokens)
     if current_tokens <= max_tokens:
         return text, False
+    result, _ = _finish_truncation(text[:target_chars], current_tokens, max_tokens)
+    return result, True
+
 
-    # Приблизна кількість символів для бажаного ліміту токенів
-    target_chars = int(max_tokens * 3.5)
-    truncated = text[:target_chars]
+def _finish_truncation(truncated: str, current_tokens: int, max_tokens: int) -> tuple[str, int]:
+    """Cut a max_tokens-token prefix at its last full line and append the truncation warning.
 
-    # Обрізати по останньому повному рядку
-    last_newline = truncated.rfind("\n")
+    Returns:
+        Tuple of (text, approximate token count of the text).
+    """
+    target_chars = len(truncated)
+    dropped = ""
+    # Обрізати по останньому повному рядку, якщо він в останніх 20% тексту
+    last_newline = truncated.rfind("\n", int(target_chars * 0.8) + 1)
     if last_newline > target_chars * 0.8:
+        dropped = truncated[last_newline:]
         truncated = truncated[:last_newline]
 
     warning = (
@@ -51,20 +158,76 @@ def truncate_text(text: str, max_tokens: int) -> tuple[str, bool]:
         f"ліміт: {max_tokens} токенів.]"
     )
     logger.warning(
-        "Text truncated from ~%d to ~%d estimated tokens",
+        "Text truncated from ~%d tokens to the %d-token limit",
         current_tokens,
-        estimate_tokens(truncated),
+        max_tokens,
     )
-    return truncated + warning, True
+    # Префікс — це max_tokens токенів; перекодовуємо лише відкинутий хвіст і попередження
+    return truncated + warning, max_tokens - estimate_tokens(dropped) + estimate_tokens(warning)
 
 
 def combine_extracted_texts(file_texts: dict[str, str]) -> str:
     """Combine extracted texts from multiple files with headers.
 
+    Standalone helper; the analyze endpoint uses combine_and_truncate().
+
     Args:
         file_texts: Mapping of filename to extracted text.
     """
-    parts = []
+    if len(file_texts) == 1:
+        (filename, text), = file_texts.items()
+        return f"=== FILE: {filename} ===\n{text}"
+
+    buf = io.StringIO()
+    sep = ""
     for filename, text in file_texts.items():
-        parts.append(f"=== FILE: {filename} ===\n{text}")
-    return "\n\n".join(parts)
+        # Роздільник перед кожним файлом, крім першого — без rstrip() тексту
+        buf.write(sep)
+        buf.write("=== FILE: ")
+        buf.write(filename)
+        buf.write(" ===\n")
+        buf.write(text)
+        sep = "\n\n"
+    return buf.getvalue()
+
+
+def combine_and_truncate(file_texts: dict[str, str], max_tokens: int) -> tuple[str, bool, int]:
+    """Combine file texts and truncate to max_tokens.
+
+    Same result as combine_extracted_texts() followed by truncate_text(),
+    up to token boundaries between pieces: pieces are tokenized one at a
+    time and only those that fit the limit are joined. CPU-bound; call it
+    off the event loop.
+
+    Returns:
+        Tuple of (text, was_truncated flag, token count of the text).
+    """
+    if len(file_texts) == 1:
+        # Типовий випадок — один файл: без циклу і роздільників
+        (filename, text), = file_texts.items()
+        pieces = [f"=== FILE: {filename} ===\n", text]
+    else:
+        pieces = []
+        for filename, text in file_texts.items():
+            if pieces:
+                pieces.append("\n\n")
+            pieces.append(f"=== FILE: {filename} ===\n")
+            pieces.append(text)
+
+    kept: list[str] = []
+    used = 0
+    for idx, piece in enumerate(pieces):
+        piece_tokens, cut_chars = _count_and_cut(piece, max_tokens - used)
+        if used + piece_tokens <= max_tokens:
+            kept.append(piece)
+            used += piece_tokens
+            continue
+
+        kept.append(piece[:cut_chars])
+        # Решту файлів не токенізуємо — для повідомлення досить оцінки за довжиною
+        rest_chars = sum(map(len, pieces[idx + 1:]))
+        current_tokens = used + piece_tokens + _tokens_for_length(rest_chars)
+        result, result_tokens = _finish_truncation("".join(kept), current_tokens, max_tokens)
+        return result, True, result_tokens
+
+    return "".join(kept), False, used